@@ -1,14 +1,14 @@
 import os
-import json
-import hashlib
 
+import numpy as np
 import pandas as pd
 import streamlit as st
-import networkx as nx
-import plotly.graph_objects as go
 
-ACTIONS_PATH = "data/user_actions.csv"
-LEDGER_PATH = "ledger/decision_influence_log.jsonl"
+from ttrace_common import (
+    ACTIONS_PATH, LEDGER_PATH, INDEX_PATH,
+    load_user_actions, load_events_by_id, influential_events, feature_to_label,
+    load_ledger_index, load_user_ledger, verify_chain_cached, make_influence_figure,
+)
 
 st.set_page_config(page_title="T-Trace: Multi-Category Behavioral Influence", layout="wide")
 
@@ -44,34 +44,19 @@ st.markdown("<div class='title-neon'>T-Trace: Multi-Category Behavioral Influenc
 st.caption("Analytical interpretation of how past behavior influences purchase decisions")
 
 # ---------------------- Load data ----------------------
-if not (os.path.exists(ACTIONS_PATH) and os.path.exists(LEDGER_PATH)):
+if not (os.path.exists(ACTIONS_PATH) and os.path.exists(LEDGER_PATH) and os.path.exists(INDEX_PATH)):
     st.error("Run data generation, model, and logger scripts first.")
     st.stop()
 
-actions = pd.read_csv(ACTIONS_PATH)
-with open(LEDGER_PATH, "r", encoding="utf-8") as f:
-    ledger_records = [json.loads(line) for line in f]
+events_by_id = load_events_by_id()
+ledger_index = load_ledger_index()
 
-if len(ledger_records) == 0:
+if not ledger_index:
     st.warning("Ledger is empty: no logged purchase decisions.")
     st.stop()
 
 # ---------------------- Verify hash chain ----------------------
-def verify_chain(records):
-    prev_hash = "0"*64
-    for rec in records:
-        rec_copy = rec.copy()
-        stored_hash = rec_copy.pop("hash")
-        payload = json.dumps(rec_copy, sort_keys=True, separators=(",", ":"))
-        calc_hash = hashlib.sha256((prev_hash + payload).encode("utf-8")).hexdigest()
-        if calc_hash != stored_hash:
-            return False
-        if rec_copy["prev_hash"] != prev_hash:
-            return False
-        prev_hash = stored_hash
-    return True
-
-chain_ok = verify_chain(ledger_records)
+chain_ok, _, _ = verify_chain_cached()
 
 st.markdown("<div class='section'>🔐 Ledger Integrity</div>", unsafe_allow_html=True)
 if chain_ok:
@@ -83,38 +68,18 @@ if chain_ok:
 else:
     st.error("Ledger hash chain invalid: integrity has been compromised.")
 
-st.write(f"Total logged purchase decisions: **{len(ledger_records)}**")
+st.write(f"Total logged purchase decisions: **{sum(len(spans) for spans in ledger_index.values())}**")
 
 # ---------------------- Sidebar: user selection ----------------------
-user_ids = sorted(set(rec["user_id"] for rec in ledger_records))
+user_ids = sorted(ledger_index)
 selected_user = st.sidebar.selectbox("Select User ID", user_ids)
 
-user_ledger = [rec for rec in ledger_records if rec["user_id"] == selected_user]
-
-# ---------------------- Helper: nice labels for features ----------------------
-def feature_to_label(name: str) -> str:
-    mapping = {
-        "total_events": "overall activity volume",
-        "searches": "number of searches",
-        "watch_videos": "number of video interactions",
-        "read_articles": "article reading activity",
-        "compares": "product comparison activity",
-        "product_views": "product view activity",
-    }
-    if name in mapping:
-        return mapping[name]
-    elif name.endswith("_events"):
-        base = name.replace("_events", "")
-        return f"interactions in {base} category"
-    else:
-        return name
+user_ledger = load_user_ledger(selected_user, ledger_index)
 
 # ---------------------- Section: Timeline ----------------------
 st.markdown("<div class='section'>🕒 User Timeline (Recent Behavior)</div>", unsafe_allow_html=True)
 
-user_events = actions[actions["user_id"] == selected_user].copy()
-user_events["timestamp"] = pd.to_datetime(user_events["timestamp"])
-user_events = user_events.sort_values("timestamp")
+user_events = load_user_actions(selected_user)
 
 st.dataframe(
     user_events.tail(20)[["timestamp", "event_id", "event_type", "category", "query_text", "product_id"]],
@@ -124,10 +89,10 @@ st.dataframe(
 # ---------------------- Section: Decision Explanation ----------------------
 st.markdown("<div class='section'>🧠 Purchase Decision Explanation</div>", unsafe_allow_html=True)
 
-decision_ids = [rec["decision_id"] for rec in user_ledger]
+decision_ids = list(user_ledger)
 selected_decision_id = st.selectbox("Select Decision ID", decision_ids)
 
-rec = next(r for r in user_ledger if r["decision_id"] == selected_decision_id)
+rec = user_ledger[selected_decision_id]
 
 product = rec["product_id"]
 prod_cat = rec.get("product_category", "unknown")
@@ -136,20 +101,17 @@ shap_dict = rec["top_shap_features"]
 
 # Build SHAP table sorted by absolute impact (S1)
 if shap_dict:
-    shap_df = (
-        pd.DataFrame(
-            [
-                {
-                    "Feature": k,
-                    "Description": feature_to_label(k),
-                    "SHAP Value": v,
-                    "Abs Impact": abs(v),
-                }
-                for k, v in shap_dict.items()
-            ]
-        )
-        .sort_values("Abs Impact", ascending=False)
-        .reset_index(drop=True)
+    keys = np.array(list(shap_dict.keys()), dtype=object)
+    vals = np.fromiter(shap_dict.values(), dtype=np.float64, count=len(shap_dict))
+    abs_vals = np.abs(vals)
+    order = np.argsort(-abs_vals, kind="stable")
+    shap_df = pd.DataFrame(
+        {
+            "Feature": keys[order],
+            "Description": [feature_to_label(k) for k in keys[order]],
+            "SHAP Value": vals[order],
+            "Abs Impact": abs_vals[order],
+        }
     )
 else:
     shap_df = pd.DataFrame(columns=["Feature", "Description", "SHAP Value", "Abs Impact"])
@@ -180,7 +142,7 @@ st.dataframe(
 st.markdown("<div class='section'>📚 Influential Past Events</div>", unsafe_allow_html=True)
 
 infl_ids = rec.get("influential_event_ids", [])
-infl_events = user_events[user_events["event_id"].isin(infl_ids)]
+infl_events = influential_events(events_by_id.get(selected_user, {}), infl_ids, user_events.columns)
 
 if infl_events.empty:
     st.info("No specific past events were mapped for this decision (history too sparse or not matched).")
@@ -198,73 +160,8 @@ else:
 # ---------------------- Influence Graph ----------------------
 st.markdown("<div class='section'>🕸 Influence Graph (Conceptual)</div>", unsafe_allow_html=True)
 
-# Build graph: influential actions -> decision node
-G = nx.DiGraph()
-center_label = f"purchase\n{prod_cat}"
-G.add_node(rec["decision_id"], color="#00ffff", size=32, label=center_label)
-
-color_map = {
-    "fitness": "#00ff88",
-    "smartphone": "#ff8800",
-    "gaming": "#ff00ff",
-    "home_entertainment": "#00aaff",
-    "computer": "#ffaa00",
-}
-
-for _, ev in infl_events.iterrows():
-    eid = ev["event_id"]
-    cat = ev["category"]
-    node_color = color_map.get(cat, "#bbbbbb")
-    label = f"{ev['event_type']}\n{cat}"
-    G.add_node(eid, color=node_color, size=18, label=label)
-    G.add_edge(eid, rec["decision_id"])
-
-# Draw if there is more than just the center node
-if len(G.nodes) > 1:
-    pos = nx.spring_layout(G, seed=42)
-    fig = go.Figure()
-
-    # Nodes
-    for node, data in G.nodes(data=True):
-        x, y = pos[node]
-        fig.add_trace(
-            go.Scatter(
-                x=[x],
-                y=[y],
-                mode="markers+text",
-                marker=dict(size=data["size"], color=data["color"]),
-                text=[data["label"]],
-                textposition="bottom center",
-                hovertext=[f"Node: {node}"],
-                hoverinfo="text"
-            )
-        )
-
-    # Edges
-    for src, dst in G.edges():
-        x0, y0 = pos[src]
-        x1, y1 = pos[dst]
-        fig.add_trace(
-            go.Scatter(
-                x=[x0, x1],
-                y=[y0, y1],
-                mode="lines",
-                line=dict(color="#4444ff", width=2),
-                hoverinfo="none"
-            )
-        )
-
-    # Hide numeric axes (they have no semantic meaning)
-    fig.update_xaxes(visible=False)
-    fig.update_yaxes(visible=False)
-
-    fig.update_layout(
-        showlegend=False,
-        plot_bgcolor="#050505",
-        paper_bgcolor="#050505",
-        margin=dict(l=10, r=10, t=10, b=10),
-    )
-
+fig = make_influence_figure(rec["decision_id"], infl_events, prod_cat)
+if fig is not None:
     st.plotly_chart(fig, use_container_width=True)
 else:
     st.info("Not enough mapped events to construct an influence graph.")
@@ -1,14 +1,10 @@
 import os
-import json
-import hashlib
-import pandas as pd
 import streamlit as st
-import networkx as nx
-import plotly.graph_objects as go
-
-# Paths
-ACTIONS_PATH = "data/user_actions.csv"
-LEDGER_PATH = "ledger/decision_influence_log.jsonl"
+from ttrace_common import (
+    ACTIONS_PATH, LEDGER_PATH, INDEX_PATH, CATEGORY_ICONS,
+    load_user_actions, load_events_by_id, influential_events,
+    load_ledger_index, load_user_ledger, verify_chain_cached, make_influence_figure,
+)
 
 st.set_page_config(page_title="T-Trace Explainable Dashboard", layout="wide")
 
@@ -44,48 +40,25 @@ st.markdown("<div class='title'>🧠 T-Trace: Behavioral Influence Visualizer</d
 st.caption("Multi-category explainable AI for purchase decisions (Model: T-Trace-Multi LR)")
 
 # Data load
-if not os.path.exists(ACTIONS_PATH) or not os.path.exists(LEDGER_PATH):
+if not os.path.exists(ACTIONS_PATH) or not os.path.exists(LEDGER_PATH) or not os.path.exists(INDEX_PATH):
     st.error("Run data generation, model, and logger steps first.")
     st.stop()
 
-actions = pd.read_csv(ACTIONS_PATH)
-ledger_records = [json.loads(line) for line in open(LEDGER_PATH, "r", encoding="utf-8")]
-
-# Color & icon dictionary for categories
-CAT_META = {
-    "fitness": {"color": "#00ff88", "icon": "🏋️"},
-    "smartphone": {"color": "#ff8800", "icon": "📱"},
-    "gaming": {"color": "#ff00ff", "icon": "🎮"},
-    "home_entertainment": {"color": "#00aaff", "icon": "📺"},
-    "computer": {"color": "#ffaa00", "icon": "💻"},
-}
+events_by_id = load_events_by_id()
+ledger_index = load_ledger_index()
 
 # Sidebar - User selection
-target_users = sorted(set(r["user_id"] for r in ledger_records))
+target_users = sorted(ledger_index)
 user_id = st.sidebar.selectbox("Select User ID", target_users)
 
 # Filter user records
-user_log = [r for r in ledger_records if r["user_id"] == user_id]
-actions_u = actions[actions["user_id"] == user_id].copy()
-actions_u["timestamp"] = pd.to_datetime(actions_u["timestamp"])
-actions_u = actions_u.sort_values("timestamp")
-
-# Ledger hash integrity
-def verify_chain(records):
-    prev_hash = "0"*64
-    for rec in records:
-        rec_copy = rec.copy()
-        stored_hash = rec_copy.pop("hash")
-        payload = json.dumps(rec_copy, sort_keys=True, separators=(",", ":"))
-        new_hash = hashlib.sha256((prev_hash + payload).encode()).hexdigest()
-        if new_hash != stored_hash:
-            return False
-        prev_hash = stored_hash
-    return True
+user_log = load_user_ledger(user_id, ledger_index)
+actions_u = load_user_actions(user_id)
 
 # Section: Integrity
 st.markdown("<div class='section'>🔐 Ledger Integrity Status</div>", unsafe_allow_html=True)
-if verify_chain(ledger_records):
+chain_ok, _, _ = verify_chain_cached()
+if chain_ok:
     st.success("Ledger Valid — Integrity intact ✔ Blockchain-style proof of transparency")
 else:
     st.error("⚠ Ledger appears tampered or corrupted!")
@@ -96,9 +69,9 @@ st.dataframe(actions_u.tail(15)[["timestamp", "event_type", "category", "query_t
 
 # Decision selection
 st.markdown("<div class='section'>🛍 Purchase Decision Analysis</div>", unsafe_allow_html=True)
-decision_ids = [r["decision_id"] for r in user_log]
+decision_ids = list(user_log)
 dec_id = st.selectbox("Select a Purchase Decision", decision_ids)
-selected = next(r for r in user_log if r["decision_id"] == dec_id)
+selected = user_log[dec_id]
 
 product = selected["product_id"]
 category = selected["product_category"]
@@ -107,20 +80,29 @@ shap_feats = selected["top_shap_features"]
 influential_ids = selected["influential_event_ids"]
 
 # Natural explanation text
-st.markdown("### 🧾 Explanation Summary (Human-Readable)")
-st.markdown(f"""
+@st.cache_data(show_spinner=False)
+def render_shap_bullets(items_tuple: tuple) -> str:
+    return "".join(f"<li><b>{feat}</b>: influenced decision by {val:+.2f}</li>" for feat, val in items_tuple)
+
+@st.cache_data(show_spinner=False)
+def explanation_html(product, category, prob, shap_bullets):
+    return f"""
 <div class='explain-box'>
-You purchased a **{CAT_META.get(category,{}).get('icon','🛍')} {product}** (category: **{category}**) 
+You purchased a **{CATEGORY_ICONS.get(category,'🛍')} {product}** (category: **{category}**) 
 because your previous behavior showed strong interest in:  
 <ul>
-{''.join([f"<li><b>{feat}</b>: influenced decision by {val:+.2f}</li>" for feat,val in shap_feats.items()])}
+{shap_bullets}
 </ul>
 Model estimated your purchase likelihood as **{prob:.2f}**  
 </div>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown("### 🧾 Explanation Summary (Human-Readable)")
+shap_bullets = render_shap_bullets(tuple(shap_feats.items()))
+st.markdown(explanation_html(product, category, prob, shap_bullets), unsafe_allow_html=True)
 
 # Show influential events
-infl = actions_u[actions_u["event_id"].isin(influential_ids)]
+infl = influential_events(events_by_id.get(user_id, {}), influential_ids, actions_u.columns)
 st.markdown("### 🎯 Specific Actions That Influenced This Decision")
 if infl.empty:
     st.info("No strong influencer events could be mapped for this decision.")
@@ -128,57 +110,31 @@ else:
     st.dataframe(infl[["timestamp", "event_type", "category", "query_text"]])
 
 # Influence bar chart
-fig_bar = go.Figure()
-fig_bar.add_trace(go.Bar(
-    x=list(shap_feats.keys()),
-    y=list(shap_feats.values()),
-    marker=dict(color="#00e6e6")
-))
-fig_bar.update_layout(
-    title="Feature Contribution (SHAP)",
-    plot_bgcolor="#050505",
-    paper_bgcolor="#050505",
-    font=dict(color="white")
-)
-st.plotly_chart(fig_bar, use_container_width=True)
-
-# Influence Graph
-st.markdown("### 🕸 Influence Graph (Action → Purchase)")
-G = nx.DiGraph()
-G.add_node(dec_id, color="#00ffff", size=32, label=f"PURCHASE\n{category}")
-
-for _, row in infl.iterrows():
-    evt = row["event_id"]
-    cat = row["category"]
-    G.add_node(evt, color=CAT_META.get(cat, {"color": "#aaaaaa"})["color"], size=18,
-               label=f"{row['event_type']}\n{cat}")
-    G.add_edge(evt, dec_id)
-
-if len(G.nodes) > 1:
-    pos = nx.spring_layout(G, seed=42)
-    fig = go.Figure()
-    for node,data in G.nodes(data=True):
-        x,y = pos[node]
-        fig.add_trace(go.Scatter(
-            x=[x], y=[y],
-            mode="markers+text",
-            marker=dict(size=data["size"], color=data["color"]),
-            text=[data["label"]],
-            textposition="bottom center"
-        ))
-    for a,b in G.edges():
-        x0,y0 = pos[a]
-        x1,y1 = pos[b]
-        fig.add_trace(go.Scatter(x=[x0, x1], y=[y0, y1], mode="lines",
-                                 line=dict(color="#4444ff", width=2)))
-    fig.update_layout(
-        showlegend=False,
-        xaxis=dict(visible=False),
-        yaxis=dict(visible=False),
+@st.cache_resource(show_spinner=False, max_entries=256)
+def shap_bar_figure(shap_items):
+    import plotly.graph_objects as go
+
+    fig_bar = go.Figure()
+    fig_bar.add_trace(go.Bar(
+        x=[feat for feat, _ in shap_items],
+        y=[val for _, val in shap_items],
+        marker=dict(color="#00e6e6")
+    ))
+    fig_bar.update_layout(
+        title="Feature Contribution (SHAP)",
         plot_bgcolor="#050505",
         paper_bgcolor="#050505",
-        margin=dict(l=20,r=20,t=20,b=20)
+        font=dict(color="white")
     )
+    return fig_bar
+
+st.plotly_chart(shap_bar_figure(tuple(shap_feats.items())), use_container_width=True)
+
+# Influence Graph
+st.markdown("### 🕸 Influence Graph (Action → Purchase)")
+graph_style = dict(default_color="#aaaaaa", hover=None, edge_hover=True, margin=20)
+fig = make_influence_figure(dec_id, infl, category, center_label=f"PURCHASE\n{category}", style=graph_style)
+if fig is not None:
     st.plotly_chart(fig, use_container_width=True)
 else:
     st.info("Not enough events to show a graph here.")
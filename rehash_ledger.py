@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+
+import orjson
+
+LEDGER_PATH = "ledger/decision_influence_log.jsonl"
+INDEX_PATH = "ledger/index.json"
+
+# One-shot migration: re-hash an older ledger with the current chaining rules of logger.ipynb
+# (BLAKE2b over the raw previous digest). Older formats: SHA-256, then BLAKE2b over the hex prev_hash.
+def sha256_hex_chain_hash(rec_no_hash: dict, prev_hash: str) -> str:
+    payload = json.dumps(rec_no_hash, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256((prev_hash + payload).encode("utf-8")).hexdigest()
+
+def blake2b_hex_chain_hash(rec_no_hash: dict, prev_hash: str) -> str:
+    payload = orjson.dumps(rec_no_hash, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(prev_hash.encode("utf-8") + payload, digest_size=32).hexdigest()
+
+LEGACY_HASHES = {"SHA-256": sha256_hex_chain_hash, "BLAKE2b (hex prev_hash)": blake2b_hex_chain_hash}
+
+def compute_record_hash(rec_no_hash: dict, prev_hash: str) -> str:
+    payload = orjson.dumps(rec_no_hash, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(bytes.fromhex(prev_hash) + payload, digest_size=32).hexdigest()
+
+def chain_verifies(records, record_hash) -> bool:
+    prev_hash = "0" * 64
+    for rec in records:
+        rec_no_hash = {k: v for k, v in rec.items() if k != "hash"}
+        if rec_no_hash["prev_hash"] != prev_hash or record_hash(rec_no_hash, prev_hash) != rec["hash"]:
+            return False
+        prev_hash = rec["hash"]
+    return True
+
+if not os.path.exists(LEDGER_PATH):
+    raise SystemExit(f"No ledger found at {LEDGER_PATH}; run logger.ipynb first.")
+
+with open(LEDGER_PATH, "r", encoding="utf-8") as f:
+    records = [json.loads(line) for line in f]
+
+if chain_verifies(records, compute_record_hash):
+    raise SystemExit(f"{LEDGER_PATH} already uses the current hash chain; nothing to do.")
+
+# Refuse to re-hash a chain that does not verify under any known format: that would launder tampering
+legacy = next((name for name, record_hash in LEGACY_HASHES.items() if chain_verifies(records, record_hash)), None)
+if legacy is None:
+    raise SystemExit(f"{LEDGER_PATH} does not verify under any known hash chain; aborting.")
+
+prev_hash = "0" * 64
+ledger_index = {}
+offset = 0
+with open(LEDGER_PATH, "wb") as f_ledger:
+    for rec in records:
+        rec_no_hash = {k: v for k, v in rec.items() if k != "hash"}
+        rec_no_hash["prev_hash"] = prev_hash
+        rec_hash = compute_record_hash(rec_no_hash, prev_hash)
+        line = (json.dumps({**rec_no_hash, "hash": rec_hash}) + "\n").encode("utf-8")
+        f_ledger.write(line)
+        ledger_index.setdefault(str(rec["user_id"]), []).append([offset, len(line)])
+        offset += len(line)
+        prev_hash = rec_hash
+
+with open(INDEX_PATH, "w", encoding="utf-8") as f_index:
+    json.dump(ledger_index, f_index)
+
+print(f"✓ Re-hashed {len(records)} ledger records ({legacy} -> BLAKE2b over raw digests).")
+print(f"→ {LEDGER_PATH}")
+print(f"→ {INDEX_PATH}")
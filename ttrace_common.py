@@ -0,0 +1,269 @@
+import os
+import math
+import mmap
+import hashlib
+from functools import lru_cache
+
+import orjson
+import pandas as pd
+import streamlit as st
+
+# Shared loaders, ledger verification and influence graph for the T-Trace dashboards (E1, E2, E3, db).
+# Keeping them in one module means the st.cache_* entries are shared by every app in the same process.
+
+ACTIONS_PATH = "data/user_actions.parquet"
+LEDGER_PATH = "ledger/decision_influence_log.jsonl"
+INDEX_PATH = "ledger/index.json"
+
+CATEGORY_COLORS = {
+    "fitness": "#00ff88",
+    "smartphone": "#ff8800",
+    "gaming": "#ff00ff",
+    "home_entertainment": "#00aaff",
+    "computer": "#ffaa00",
+}
+
+CATEGORY_ICONS = {
+    "gaming": "🎮",
+    "smartphone": "📱",
+    "fitness": "🏋️",
+    "computer": "💻",
+    "home_entertainment": "📺",
+}
+
+# ---------------------- Actions ----------------------
+def _read_actions(path):
+    # Parquet keeps the timestamp column as datetime64, so nothing needs re-parsing.
+    # Not cached itself: only _group_actions reads it, and that resource already keeps one file version
+    return pd.read_parquet(path)
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _group_actions(path, mtime):
+    # Shared across reruns without copying (one file version kept): treat the frames as read-only.
+    # The empty frame (same columns) stands in for users with no actions, so apps never need the full frame
+    actions = _read_actions(path)
+    return dict(tuple(actions.sort_values("timestamp", kind="stable").groupby("user_id"))), actions.iloc[:0]
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _index_events(path, mtime):
+    # Nested per user: the short random event ids are not guaranteed unique across users
+    groups, _ = _group_actions(path, mtime)
+    return {
+        uid: {ev.event_id: ev._asdict() for ev in sub.itertuples(index=False)}
+        for uid, sub in groups.items()
+    }
+
+def load_user_actions(user_id):
+    groups, empty = _group_actions(ACTIONS_PATH, os.path.getmtime(ACTIONS_PATH))
+    return groups.get(user_id, empty)
+
+def load_events_by_id():
+    return _index_events(ACTIONS_PATH, os.path.getmtime(ACTIONS_PATH))
+
+def influential_events(user_events_by_id, event_ids, columns):
+    # Direct lookups (deduplicated, in timeline order) instead of an isin() scan over the history
+    rows = [user_events_by_id[eid] for eid in dict.fromkeys(event_ids) if eid in user_events_by_id]
+    rows.sort(key=lambda ev: ev["timestamp"])
+    return pd.DataFrame(rows, columns=columns)
+
+# ---------------------- Feature labels ----------------------
+# Module-level, so the lru_cache lives for the process rather than being rebuilt by every script rerun
+@lru_cache(maxsize=128)
+def feature_to_label(name: str) -> str:
+    mapping = {
+        "total_events": "overall activity volume",
+        "searches": "number of searches",
+        "watch_videos": "number of video interactions",
+        "read_articles": "article reading activity",
+        "compares": "product comparison activity",
+        "product_views": "product view activity",
+    }
+    if name in mapping:
+        return mapping[name]
+    elif name.endswith("_events"):
+        base = name.replace("_events", "")
+        return f"interactions in {base} category"
+    else:
+        return name
+
+# ---------------------- Ledger ----------------------
+@st.cache_data(show_spinner=False, max_entries=1)
+def _read_ledger_index(path, mtime):
+    # user_id -> [[byte_offset, length], ...] of that user's ledger lines, written by the logger
+    with open(path, "rb") as f:
+        return {int(uid): spans for uid, spans in orjson.loads(f.read()).items()}
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _read_user_ledger(path, mtime, user_id, spans):
+    # Decode only the selected user's records, read straight from their byte offsets.
+    # Keyed by decision_id (in ledger order) so a selected decision is a dict lookup, not a scan.
+    # Bounded because every ledger append changes mtime and strands the previous entries
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        records = (orjson.loads(mm[off:off + length]) for off, length in spans)
+        return {rec["decision_id"]: rec for rec in records}
+
+def load_ledger_index():
+    return _read_ledger_index(INDEX_PATH, os.path.getmtime(INDEX_PATH))
+
+def load_user_ledger(user_id, ledger_index):
+    return _read_user_ledger(LEDGER_PATH, os.path.getmtime(LEDGER_PATH), user_id, ledger_index[user_id])
+
+# ---------------------- Integrity ----------------------
+@st.cache_resource
+def chain_checkpoint(path):
+    # Last verified prefix of the ledger: its length, a BLAKE2b digest of its bytes, record count, last hash
+    return {"offset": 0, "prefix_digest": b"", "count": 0, "last_hash": "0" * 64}
+
+# Persisted to disk so a cold start skips re-hashing an unchanged ledger. A hit after a restart leaves the
+# checkpoint empty, so the first append after that is verified from the start again
+@st.cache_data(persist="disk", show_spinner=False)
+def verify_chain(path, mtime, size):
+    state = chain_checkpoint(path)
+    offset, count, prev_hash = 0, 0, "0" * 64
+    prefix = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        # Only resume when the ledger grew and the verified prefix is byte-for-byte unchanged (one digest
+        # over the raw bytes in 1 MiB blocks, no JSON work); any other change is re-verified from scratch
+        if 0 < state["offset"] < size:
+            remaining = state["offset"]
+            for block in iter(lambda: f.read(min(remaining, 1 << 20)), b""):
+                prefix.update(block)
+                remaining -= len(block)
+            if prefix.digest() == state["prefix_digest"]:
+                offset, count, prev_hash = state["offset"], state["count"], state["last_hash"]
+            else:
+                prefix = hashlib.blake2b(digest_size=32)
+        # Stream the unverified tail line by line rather than materializing every record.
+        # Each record is hashed over the raw 32-byte previous digest, not its 64-char hex form
+        prev_digest = bytes.fromhex(prev_hash)
+        f.seek(offset)
+        for line in f:
+            if line.strip():
+                rec = orjson.loads(line)
+                h = hashlib.blake2b(prev_digest, digest_size=32)
+                h.update(orjson.dumps({k: v for k, v in rec.items() if k != "hash"}, option=orjson.OPT_SORT_KEYS))
+                if h.hexdigest() != rec["hash"] or rec["prev_hash"] != prev_hash:
+                    state.update(offset=offset, prefix_digest=prefix.digest(), count=count, last_hash=prev_hash)
+                    return False, prev_hash, count
+                prev_hash, prev_digest = rec["hash"], h.digest()
+                count += 1
+            prefix.update(line)
+            offset += len(line)
+    state.update(offset=offset, prefix_digest=prefix.digest(), count=count, last_hash=prev_hash)
+    return True, prev_hash, count
+
+def verify_chain_cached():
+    # (ok, last_hash, verified_count) for the ledger on disk
+    return verify_chain(LEDGER_PATH, os.path.getmtime(LEDGER_PATH), os.path.getsize(LEDGER_PATH))
+
+# ---------------------- Influence graph ----------------------
+def star_layout(center, leaves):
+    # Every influential event points at the decision: put it in the middle, events on a unit circle
+    k = len(leaves)
+    pos = {center: (0.0, 0.0)}
+    for i, eid in enumerate(leaves):
+        pos[eid] = (math.cos(2 * math.pi * i / k), math.sin(2 * math.pi * i / k))
+    return pos
+
+# Influence-graph look (E2's); apps pass their own overrides through style= so each keeps its rendering
+GRAPH_STYLE = {
+    "colors": CATEGORY_COLORS,
+    "default_color": "#bbbbbb",
+    "center_color": "#00ffff",
+    "center_size": 32,
+    "leaf_size": 18,
+    "title_case_events": False,
+    "node_border": None,
+    "hover": "Node: {node}",  # formatted with node=, label=; None keeps Plotly's default hover
+    "edge_color": "#4444ff",
+    "edge_hover": False,
+    "hide_axes": True,
+    "margin": 10,
+}
+
+def make_influence_figure(decision_id, infl_rows, category, center_label=None, style=None):
+    # Influential actions -> decision node; None when no event could be mapped
+    if infl_rows.empty:
+        return None
+    infl_tuple = tuple(infl_rows[["event_id", "event_type", "category"]].itertuples(index=False, name=None))
+    return build_figure(decision_id, infl_tuple, category, center_label, style)
+
+@st.cache_resource(show_spinner=False, max_entries=256)
+def build_figure(decision_id, infl_tuple, category, center_label=None, style=None):
+    # Plotly figures are not serializable, so they are cached as shared resources: do not mutate them
+    # Imported here so apps pay for Plotly only once a graph is actually drawn
+    import plotly.graph_objects as go
+
+    style = {**GRAPH_STYLE, **(style or {})}
+    nodes = {decision_id: dict(color=style["center_color"], size=style["center_size"], label=center_label or f"purchase\n{category}")}
+    edges = []
+    for eid, event_type, ev_cat in infl_tuple:
+        if style["title_case_events"]:
+            event_type = event_type.replace("_", " ").title()
+        nodes[eid] = dict(
+            color=style["colors"].get(ev_cat, style["default_color"]),
+            size=style["leaf_size"],
+            label=f"{event_type}\n{ev_cat}",
+        )
+        edges.append((eid, decision_id))
+
+    pos = star_layout(decision_id, [src for src, _ in edges])
+    fig = go.Figure()
+
+    # Nodes (a single trace for all of them)
+    xs, ys, texts, colors, sizes, hovers = [], [], [], [], [], []
+    for node, data in nodes.items():
+        x, y = pos[node]
+        xs.append(x)
+        ys.append(y)
+        texts.append(data["label"])
+        colors.append(data["color"])
+        sizes.append(data["size"])
+        if style["hover"]:
+            hovers.append(style["hover"].format(node=node, label=data["label"]))
+    marker = dict(size=sizes, color=colors)
+    if style["node_border"]:
+        marker["line"] = dict(width=style["node_border"])
+    hover = dict(hovertext=hovers, hoverinfo="text") if style["hover"] else {}
+    fig.add_trace(
+        go.Scatter(
+            x=xs,
+            y=ys,
+            mode="markers+text",
+            marker=marker,
+            text=texts,
+            textposition="bottom center",
+            **hover
+        )
+    )
+
+    # Edges (a single trace; None breaks the line between segments)
+    edge_x, edge_y = [], []
+    for src, dst in edges:
+        x0, y0 = pos[src]
+        x1, y1 = pos[dst]
+        edge_x += [x0, x1, None]
+        edge_y += [y0, y1, None]
+    fig.add_trace(
+        go.Scatter(
+            x=edge_x,
+            y=edge_y,
+            mode="lines",
+            line=dict(color=style["edge_color"], width=2),
+            **({} if style["edge_hover"] else dict(hoverinfo="none"))
+        )
+    )
+
+    # Hide numeric axes (they have no semantic meaning)
+    if style["hide_axes"]:
+        fig.update_xaxes(visible=False)
+        fig.update_yaxes(visible=False)
+
+    m = style["margin"]
+    fig.update_layout(
+        showlegend=False,
+        plot_bgcolor="#050505",
+        paper_bgcolor="#050505",
+        margin=dict(l=m, r=m, t=m, b=m),
+    )
+    return fig